@@ -1,863 +1,1408 @@
-#!/usr/bin/env python3
-"""
-WEATHER BOT — Copy-Trade Top PnL Leaders on Weather Markets
-============================================================
-
-Strategy:
-  1. Continuously scan Polymarket for weather/temperature/climate markets
-  2. When found, identify top PnL traders on those markets
-  3. Copy their YES/NO positions with fixed $5 bets
-  4. Auto-resolve and redeem winning positions
-
-Modes:
-  PAPER — Simulate trades with paper money (no real orders)
-  LIVE  — Execute real FOK orders on CLOB
-
-Runs idle when no weather markets exist. Scans every 5 minutes.
-"""
-
-import time
-import csv
-import os
-import sys
-import json
-import traceback
-import tempfile
-from datetime import datetime, timezone, timedelta
-
-import requests
-from dotenv import load_dotenv
-from py_clob_client.client import ClobClient
-from py_clob_client.clob_types import ApiCreds, OrderArgs, OrderType
-from py_clob_client.order_builder.constants import BUY
-
-# ═══════════════════════════════════════════════════════════════
-# CREDENTIALS
-# ═══════════════════════════════════════════════════════════════
-load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
-
-clob_client = ClobClient(
-    "https://clob.polymarket.com",
-    key=os.environ["POLYMARKET_PRIVATE_KEY"],
-    chain_id=137,
-    creds=ApiCreds(
-        api_key=os.environ["POLYMARKET_API_KEY"],
-        api_secret=os.environ["POLYMARKET_API_SECRET"],
-        api_passphrase=os.environ["POLYMARKET_PASSPHRASE"],
-    ),
-)
-
-# ═══════════════════════════════════════════════════════════════
-# CONFIG
-# ═══════════════════════════════════════════════════════════════
-GAMMA_API = "https://gamma-api.polymarket.com"
-CLOB_API = "https://clob.polymarket.com"
-DATA_API = "https://data-api.polymarket.com"
-
-# ── PAPER TRADING MODE ──────────────────────────────────────
-PAPER_MODE = True                    # True = simulate, False = live orders
-PAPER_HOURS = 12                     # Auto-halt after N hours of paper trading
-PAPER_STARTED = None                 # Set at runtime
-
-# Weather keywords to match market questions
-WEATHER_KEYWORDS = [
-    "temperature", "weather", "degrees", "°f", "°c",
-    "fahrenheit", "celsius", "snow", "rainfall", "precipitation",
-    "tornado", "flood", "drought", "heat wave", "polar vortex",
-    "el nino", "la nina", "noaa", "hottest", "coldest", "warmest",
-    "record high", "record low", "winter storm", "blizzard",
-    "tropical storm", "hurricane season", "atlantic hurricane",
-    "climate", "wildfire", "wind speed", "arctic", "ice extent",
-    "sea ice", "record year",
-]
-
-# Scanning
-SCAN_INTERVAL = 300       # 5 minutes between scans
-IDLE_SCAN_INTERVAL = 600  # 10 minutes when no markets found (save API calls)
-TOP_TRADERS_COUNT = 10    # Copy top N PnL traders
-
-# Trading
-BET_SIZE = 5.00           # Fixed $5 per trade
-MIN_ASK = 0.10            # Min price (avoid tiny-chance bets)
-MAX_ASK = 0.95            # Max price (avoid near-certain bets with thin ROI)
-MAX_SPREAD = 0.10         # Max bid-ask spread
-
-# Risk
-STARTING_BANKROLL = 1000.00          # Paper money bankroll
-KILL_SWITCH_MIN = 100.00
-MAX_PENDING = 50
-
-# Files
-STATE_FILE = "data/weather_state.json"
-LOG_FILE = "data/weather_trades.csv"
-
-LOG_FIELDS = [
-    "timestamp", "question", "outcome", "leader_address",
-    "leader_pnl", "leader_position",
-    "clob_ask", "clob_bid", "spread",
-    "bet_size", "shares", "potential_profit",
-    "token_id", "condition_id", "order_id",
-    "resolved", "won", "pnl", "bankroll_after", "paper",
-]
-
-
-# ═══════════════════════════════════════════════════════════════
-# STATE & LOGGING
-# ═══════════════════════════════════════════════════════════════
-
-def load_state() -> dict:
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE) as f:
-                data = json.load(f)
-            if data.get("version") == 2:
-                return data
-        except Exception:
-            pass
-    return {
-        "version": 2,
-        "bankroll": STARTING_BANKROLL,
-        "pnl": 0.0,
-        "wins": 0,
-        "losses": 0,
-        "trades": 0,
-        "pending": [],
-        "traded_tokens": [],
-        "markets_seen": 0,
-        "last_market_found": None,
-    }
-
-
-def save_state(state):
-    """Atomic write: tmpfile + rename."""
-    tmp_fd, tmp_path = tempfile.mkstemp(
-        dir=os.path.dirname(STATE_FILE) or ".", suffix=".tmp"
-    )
-    try:
-        with os.fdopen(tmp_fd, "w") as f:
-            json.dump(state, f, indent=2, default=str)
-        os.replace(tmp_path, STATE_FILE)
-    except Exception:
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
-        raise
-
-
-def init_log():
-    os.makedirs("data", exist_ok=True)
-    if not os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "w", newline="") as f:
-            csv.DictWriter(f, fieldnames=LOG_FIELDS).writeheader()
-
-
-def log_trade(trade: dict):
-    with open(LOG_FILE, "a", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=LOG_FIELDS)
-        writer.writerow({k: trade.get(k, "") for k in LOG_FIELDS})
-
-
-# ═══════════════════════════════════════════════════════════════
-# MARKET SCANNER
-# ═══════════════════════════════════════════════════════════════
-
-def is_weather_market(market: dict) -> bool:
-    """Check if a market is weather-related based on question + description."""
-    q = (market.get("question", "") or "").lower()
-    desc = (market.get("description", "") or "").lower()
-    text = q + " " + desc
-    return any(kw in text for kw in WEATHER_KEYWORDS)
-
-
-def scan_weather_markets() -> list:
-    """
-    Scan all active Polymarket markets for weather-related ones.
-    Returns list of weather market dicts sorted by liquidity (highest first).
-    """
-    all_markets = []
-    offset = 0
-
-    while offset < 5000:
-        try:
-            resp = requests.get(
-                f"{GAMMA_API}/markets",
-                params={
-                    "active": True,
-                    "closed": False,
-                    "limit": 100,
-                    "offset": offset,
-                },
-                timeout=15,
-            )
-            if resp.status_code != 200:
-                break
-            batch = resp.json()
-            if not batch:
-                break
-            all_markets.extend(batch)
-            if len(batch) < 100:
-                break
-            offset += 100
-            time.sleep(0.1)  # rate limit
-        except Exception as e:
-            print(f"  [WARN] Gamma scan error at offset {offset}: {e}")
-            break
-
-    weather = [m for m in all_markets if is_weather_market(m)]
-
-    # Sort by liquidity (most liquid first)
-    weather.sort(key=lambda x: float(x.get("liquidityNum", 0) or 0), reverse=True)
-    return weather
-
-
-# ═══════════════════════════════════════════════════════════════
-# TOP PNL LEADER IDENTIFICATION
-# ═══════════════════════════════════════════════════════════════
-
-def get_top_traders(condition_id: str) -> list:
-    """
-    Get top PnL traders for a specific market condition.
-    Uses Polymarket's data API to find traders with highest profit.
-    Returns list of {"address": str, "pnl": float, "position": "YES"/"NO", "size": float}
-    """
-    try:
-        # Get market activity/positions
-        resp = requests.get(
-            f"{DATA_API}/activity",
-            params={
-                "market": condition_id,
-                "limit": 50,
-            },
-            timeout=15,
-        )
-        if resp.status_code != 200:
-            return []
-        activities = resp.json()
-        if not activities:
-            return []
-
-        # Aggregate PnL by trader address
-        trader_pnl = {}
-        for a in activities:
-            addr = a.get("proxyWalletAddress", "") or a.get("address", "")
-            if not addr:
-                continue
-            pnl = float(a.get("usdcSize", 0) or 0)
-            side = a.get("side", "")
-            if addr not in trader_pnl:
-                trader_pnl[addr] = {"address": addr, "pnl": 0, "buys": 0, "sells": 0}
-            if side == "BUY":
-                trader_pnl[addr]["buys"] += pnl
-            elif side == "SELL":
-                trader_pnl[addr]["sells"] += pnl
-                trader_pnl[addr]["pnl"] += pnl  # profit from selling
-
-        # Sort by volume (proxy for engagement/confidence)
-        traders = sorted(trader_pnl.values(),
-                         key=lambda x: x["buys"] + x["sells"], reverse=True)
-        return traders[:TOP_TRADERS_COUNT]
-
-    except Exception as e:
-        print(f"  [WARN] Failed to get traders for {condition_id[:16]}: {e}")
-        return []
-
-
-def get_leader_positions(market: dict) -> list:
-    """
-    For a weather market, find what the top PnL traders are betting on.
-    Returns list of {"outcome": str, "confidence": float, "leaders": int}
-    """
-    condition_id = market.get("conditionId", "")
-    if not condition_id:
-        return []
-
-    outcomes = json.loads(market.get("outcomes", "[]"))
-    tokens = json.loads(market.get("clobTokenIds", "[]"))
-    prices = json.loads(market.get("outcomePrices", "[]"))
-
-    if not outcomes or not tokens:
-        return []
-
-    # Get top traders
-    traders = get_top_traders(condition_id)
-    if not traders:
-        return []
-
-    # Try to determine leader consensus from their positions
-    try:
-        wallet = os.environ.get("POLYMARKET_WALLET", "")
-        positions_data = []
-        for t in traders[:5]:  # Check top 5
-            try:
-                resp = requests.get(
-                    f"{DATA_API}/positions",
-                    params={"user": t["address"]},
-                    timeout=10,
-                )
-                if resp.status_code == 200:
-                    positions = resp.json()
-                    for p in positions:
-                        if p.get("conditionId") == condition_id:
-                            positions_data.append({
-                                "address": t["address"],
-                                "outcome": p.get("outcome", ""),
-                                "size": float(p.get("size", 0)),
-                                "pnl": t["pnl"],
-                            })
-            except Exception:
-                pass
-            time.sleep(0.2)  # rate limit
-
-        return positions_data
-    except Exception as e:
-        print(f"  [WARN] Failed to get leader positions: {e}")
-        return []
-
-
-# ═══════════════════════════════════════════════════════════════
-# TRADE EXECUTION
-# ═══════════════════════════════════════════════════════════════
-
-def get_clob_prices(token_id: str) -> dict:
-    """Get bid/ask from CLOB."""
-    result = {"bid": 0.0, "ask": 0.0}
-    try:
-        ask_r = requests.get(
-            f"{CLOB_API}/price?token_id={token_id}&side=SELL", timeout=3
-        )
-        result["ask"] = float(ask_r.json().get("price", 0))
-        bid_r = requests.get(
-            f"{CLOB_API}/price?token_id={token_id}&side=BUY", timeout=3
-        )
-        result["bid"] = float(bid_r.json().get("price", 0))
-    except Exception:
-        pass
-    return result
-
-
-def execute_trade(state, market, outcome_idx, leader_info):
-    """
-    Place a trade copying the leader's position.
-    PAPER_MODE: simulate fill at current ask (no real order).
-    LIVE:       place real FOK buy order on CLOB.
-    """
-    tokens = json.loads(market.get("clobTokenIds", "[]"))
-    outcomes = json.loads(market.get("outcomes", "[]"))
-
-    if outcome_idx >= len(tokens):
-        return False
-
-    token_id = tokens[outcome_idx]
-    outcome = outcomes[outcome_idx] if outcome_idx < len(outcomes) else "?"
-
-    prices = get_clob_prices(token_id)
-    ask = prices["ask"]
-    bid = prices["bid"]
-
-    if ask <= 0 or ask >= 1:
-        return False
-    if ask < MIN_ASK or ask > MAX_ASK:
-        print(f"  [SKIP] {outcome} ask=${ask:.2f} outside range "
-              f"${MIN_ASK:.2f}-${MAX_ASK:.2f}")
-        return False
-
-    spread = ask - bid
-    if spread > MAX_SPREAD:
-        print(f"  [SKIP] {outcome} spread=${spread:.3f} > max ${MAX_SPREAD:.2f}")
-        return False
-
-    shares = int(BET_SIZE / ask)
-    if shares < 1:
-        return False
-
-    actual_cost = round(shares * ask, 2)
-    order_id = ""
-    mode_tag = "PAPER" if PAPER_MODE else "LIVE"
-
-    if PAPER_MODE:
-        # ── PAPER: simulate instant fill at ask price ──
-        import uuid
-        order_id = f"paper-{uuid.uuid4().hex[:12]}"
-    else:
-        # ── LIVE: real FOK order ──
-        try:
-            order_args = OrderArgs(
-                token_id=token_id,
-                price=round(ask, 2),
-                size=shares,
-                side=BUY,
-            )
-            signed_order = clob_client.create_order(order_args)
-            resp = clob_client.post_order(signed_order, OrderType.FOK)
-
-            if not resp or not resp.get("success"):
-                print(f"  [NOFILL] {outcome} @ ${ask:.2f}")
-                return False
-        except Exception as e:
-            print(f"  [ERROR] Order failed: {e}")
-            return False
-        order_id = resp.get("orderID", "")
-
-    trade = {
-        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
-        "question": market.get("question", "")[:100],
-        "outcome": outcome,
-        "leader_address": leader_info.get("address", "")[:16] + "...",
-        "leader_pnl": leader_info.get("pnl", 0),
-        "leader_position": leader_info.get("outcome", ""),
-        "clob_ask": ask,
-        "clob_bid": bid,
-        "spread": round(spread, 3),
-        "bet_size": actual_cost,
-        "shares": shares,
-        "potential_profit": round(shares - actual_cost, 4),
-        "token_id": token_id,
-        "condition_id": market.get("conditionId", ""),
-        "order_id": order_id,
-        "resolved": False,
-        "paper": PAPER_MODE,
-    }
-
-    state["pending"].append(trade)
-    state["trades"] += 1
-    state["bankroll"] -= actual_cost
-    state["traded_tokens"].append(token_id)
-
-    save_state(state)
-    log_trade(trade)
-
-    roi = (1 - ask) / ask * 100
-    print(f"\n  >>> [{mode_tag}] COPY TRADE: {outcome} @ ${ask:.2f} "
-          f"({roi:.1f}% ROI)")
-    print(f"      {market.get('question', '')[:60]}")
-    print(f"      Copying leader: {leader_info.get('address', '')[:16]}... "
-          f"(PnL: ${leader_info.get('pnl', 0):,.2f})")
-    print(f"      Order: {order_id[:16]}... | "
-          f"${actual_cost:.2f} for {shares} shares")
-    print(f"      Bankroll: ${state['bankroll']:.2f}")
-
-    return True
-
-
-# ═══════════════════════════════════════════════════════════════
-# RESOLUTION
-# ═══════════════════════════════════════════════════════════════
-
-def resolve_paper_trade(t, state):
-    """
-    Resolve a paper trade by checking if the market has resolved.
-    Uses Gamma API to check if the market's condition has settled.
-    Falls back to checking if our outcome's price hit $1 or $0.
-    """
-    tid = t.get("token_id", "")
-    cid = t.get("condition_id", "")
-
-    # Check if market resolved via Gamma API
-    try:
-        resp = requests.get(
-            f"{GAMMA_API}/markets",
-            params={"condition_id": cid},
-            timeout=10,
-        )
-        if resp.status_code == 200:
-            markets = resp.json()
-            if markets:
-                m = markets[0]
-                # Market has resolved
-                if m.get("closed") or m.get("resolved"):
-                    outcome_prices = json.loads(m.get("outcomePrices", "[]"))
-                    tokens = json.loads(m.get("clobTokenIds", "[]"))
-                    # Find our token's final price
-                    for i, tok in enumerate(tokens):
-                        if tok == tid and i < len(outcome_prices):
-                            final_price = float(outcome_prices[i])
-                            won = final_price > 0.5  # our side resolved YES
-                            return won
-    except Exception:
-        pass
-
-    # Fallback: check if current price hit extreme (market settling)
-    try:
-        prices = get_clob_prices(tid)
-        if prices["ask"] >= 0.99 or prices["bid"] >= 0.99:
-            return True   # our token is worth $1 — WIN
-        if prices["ask"] <= 0.01 and prices["bid"] <= 0.01:
-            return False  # our token is worth $0 — LOSS
-    except Exception:
-        pass
-
-    return None  # not resolved yet
-
-
-def resolve_trades(state):
-    """
-    Check pending trades for resolution.
-    PAPER mode: check market resolution via Gamma/price APIs.
-    LIVE mode:  check positions via Data API.
-    """
-    if not state["pending"]:
-        return
-
-    still_pending = []
-
-    if not PAPER_MODE:
-        # ── LIVE resolution via Data API ──
-        try:
-            wallet = os.environ["POLYMARKET_WALLET"]
-            positions = requests.get(
-                f"{DATA_API}/positions?user={wallet}",
-                timeout=15,
-            ).json()
-        except Exception as e:
-            print(f"  [WARN] Resolution check failed: {e}")
-            return
-
-        pos_map = {}
-        for p in positions:
-            tid = p.get("asset", "") or p.get("tokenId", "")
-            if tid:
-                pos_map[tid] = p
-
-        for t in state["pending"]:
-            tid = t.get("token_id", "")
-            pos = pos_map.get(tid)
-
-            if pos and pos.get("redeemable"):
-                won = float(pos.get("curValue", 0)) > 0
-                _record_resolution(t, state, won)
-            else:
-                if _check_stale(t, state):
-                    continue
-                still_pending.append(t)
-    else:
-        # ── PAPER resolution via market status ──
-        for t in state["pending"]:
-            result = resolve_paper_trade(t, state)
-            if result is not None:
-                _record_resolution(t, state, result)
-            else:
-                if _check_stale(t, state):
-                    continue
-                still_pending.append(t)
-
-    state["pending"] = still_pending
-
-
-def _record_resolution(t, state, won):
-    """Record a win or loss."""
-    if won:
-        payout = t["shares"] * 1.0
-        pnl = payout - t["bet_size"]
-        state["bankroll"] += payout
-        state["wins"] += 1
-    else:
-        pnl = -t["bet_size"]
-        state["losses"] += 1
-
-    state["pnl"] += pnl
-    t["resolved"] = True
-    t["won"] = won
-    t["pnl"] = round(pnl, 4)
-    t["bankroll_after"] = round(state["bankroll"], 2)
-    log_trade(t)
-
-    mark = "WIN" if won else "LOSS"
-    mode = "[PAPER]" if t.get("paper") else "[LIVE]"
-    w, l = state["wins"], state["losses"]
-    wr = w / max(w + l, 1)
-    print(f"\n  {'>>>' if won else 'XXX'} {mode} RESOLVED: "
-          f"{t['outcome']} -> {mark}")
-    print(f"      {t['question'][:50]}")
-    print(f"      PnL: ${pnl:+.4f} | Bank: ${state['bankroll']:.2f} | "
-          f"{w}W-{l}L ({wr:.1%})")
-
-
-def _check_stale(t, state):
-    """Mark positions older than 72h as losses. Returns True if stale."""
-    try:
-        ts = datetime.fromisoformat(t["timestamp"].replace("Z", "+00:00"))
-        age = (datetime.now(timezone.utc) - ts).total_seconds()
-        if age > 259200:  # >72h
-            print(f"  [STALE] Marking as loss (>72h): {t['question'][:50]}")
-            pnl = -t["bet_size"]
-            state["losses"] += 1
-            state["pnl"] += pnl
-            t["resolved"] = True
-            t["won"] = False
-            t["pnl"] = round(pnl, 4)
-            t["bankroll_after"] = round(state["bankroll"], 2)
-            log_trade(t)
-            return True
-    except Exception:
-        pass
-    return False
-
-
-# ═══════════════════════════════════════════════════════════════
-# DISPLAY
-# ═══════════════════════════════════════════════════════════════
-
-def print_banner():
-    mode_str = "PAPER TRADING" if PAPER_MODE else "LIVE TRADING"
-    print("=" * 70)
-    print(f"  WEATHER BOT — {mode_str}")
-    print(f"  Copy-Trade Top PnL Leaders on Temperature/Weather Markets")
-    if PAPER_MODE:
-        print(f"  Paper window: {PAPER_HOURS}h — goes live after validation")
-    print(f"  Scan: every {SCAN_INTERVAL}s | "
-          f"Idle: every {IDLE_SCAN_INTERVAL}s")
-    print(f"  Bet: ${BET_SIZE:.2f} fixed | "
-          f"Ask range: ${MIN_ASK:.2f}-${MAX_ASK:.2f}")
-    print(f"  Bankroll: ${STARTING_BANKROLL:.2f} | "
-          f"Keywords: {len(WEATHER_KEYWORDS)} weather terms")
-    print(f"  {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}")
-    print("=" * 70)
-
-
-def print_dashboard(state):
-    w, l = state["wins"], state["losses"]
-    wr = w / max(w + l, 1)
-    pending = len(state["pending"])
-    mode_str = "PAPER" if PAPER_MODE else "LIVE"
-
-    # Paper mode countdown
-    time_info = ""
-    if PAPER_MODE and PAPER_STARTED:
-        elapsed = (datetime.now(timezone.utc) - PAPER_STARTED).total_seconds()
-        remaining = max(0, PAPER_HOURS * 3600 - elapsed)
-        h, m = int(remaining // 3600), int((remaining % 3600) // 60)
-        time_info = f"  Paper time left: {h}h {m}m"
-
-    print(f"\n{'=' * 70}")
-    print(f"  [{mode_str}] WEATHER DASHBOARD | "
-          f"{datetime.now(timezone.utc).strftime('%H:%M:%S UTC')}")
-    print(f"{'=' * 70}")
-    print(f"  Bankroll:  ${state['bankroll']:>10,.2f}  |  "
-          f"PnL: ${state['pnl']:>+10,.2f}")
-    print(f"  Record:    {w}W-{l}L ({wr:.1%})  |  "
-          f"Trades: {state['trades']}")
-    print(f"  Pending:   {pending} positions")
-    print(f"  Markets seen: {state['markets_seen']}  |  "
-          f"Last found: {state.get('last_market_found', 'never')}")
-    if time_info:
-        print(time_info)
-    print(f"{'=' * 70}")
-
-
-# ═══════════════════════════════════════════════════════════════
-# MAIN LOOP
-# ═══════════════════════════════════════════════════════════════
-
-def print_paper_summary(state):
-    """Print final paper trading summary after 12h window expires."""
-    w, l = state["wins"], state["losses"]
-    wr = w / max(w + l, 1)
-    total = w + l
-    print("\n" + "=" * 70)
-    print("  PAPER TRADING COMPLETE — 12 HOUR SUMMARY")
-    print("=" * 70)
-    print(f"  Starting Bankroll:  ${STARTING_BANKROLL:>10,.2f}")
-    print(f"  Final Bankroll:     ${state['bankroll']:>10,.2f}")
-    print(f"  Net PnL:            ${state['pnl']:>+10,.2f}")
-    print(f"  ROI:                {state['pnl']/STARTING_BANKROLL*100:>+.2f}%")
-    print(f"  Record:             {w}W-{l}L ({wr:.1%})")
-    print(f"  Total trades:       {total}")
-    print(f"  Still pending:      {len(state['pending'])}")
-    print(f"  Markets scanned:    {state['markets_seen']}")
-    print("=" * 70)
-    if total == 0:
-        print("  No trades placed — weather markets had no leader data.")
-        print("  Consider widening keywords or lowering MIN_ASK.")
-    elif wr >= 0.55 and state["pnl"] > 0:
-        print("  RESULT: Profitable. Safe to go LIVE.")
-        print("  Set PAPER_MODE = False and restart.")
-    elif wr >= 0.45:
-        print("  RESULT: Break-even. Review before going live.")
-    else:
-        print("  RESULT: Unprofitable. Do NOT go live without changes.")
-    print("=" * 70 + "\n")
-
-
-def run():
-    global PAPER_STARTED
-    os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    init_log()
-    state = load_state()
-
-    if PAPER_MODE:
-        PAPER_STARTED = datetime.now(timezone.utc)
-
-    print_banner()
-
-    print(f"\n  Loaded state: {state['trades']} trades, "
-          f"${state['bankroll']:.2f} bankroll, "
-          f"{len(state['pending'])} pending")
-
-    scan_count = 0
-    consecutive_empty = 0
-
-    while True:
-        try:
-            scan_count += 1
-            now_utc = datetime.now(timezone.utc)
-
-            # ── Paper mode 12h auto-halt ──
-            if PAPER_MODE and PAPER_STARTED:
-                elapsed_h = (now_utc - PAPER_STARTED).total_seconds() / 3600
-                if elapsed_h >= PAPER_HOURS:
-                    print_paper_summary(state)
-                    save_state(state)
-                    print("  Bot halted. Set PAPER_MODE=False to go live.")
-                    return
-
-            # Resolve any pending trades
-            resolve_trades(state)
-
-            # Safety checks
-            if state["bankroll"] < KILL_SWITCH_MIN:
-                print(f"\n  [KILL SWITCH] Bankroll ${state['bankroll']:.2f} "
-                      f"< ${KILL_SWITCH_MIN:.2f}")
-                print_dashboard(state)
-                save_state(state)
-                time.sleep(IDLE_SCAN_INTERVAL)
-                continue
-
-            if len(state["pending"]) >= MAX_PENDING:
-                print(f"  [MAX PENDING] {len(state['pending'])} positions")
-                save_state(state)
-                time.sleep(SCAN_INTERVAL)
-                continue
-
-            # Scan for weather markets
-            use_interval = (IDLE_SCAN_INTERVAL if consecutive_empty > 3
-                            else SCAN_INTERVAL)
-
-            print(f"\n  [SCAN #{scan_count}] "
-                  f"{now_utc.strftime('%H:%M:%S UTC')} — "
-                  f"scanning for weather markets...")
-
-            weather_markets = scan_weather_markets()
-            traded_set = set(state["traded_tokens"])
-
-            if not weather_markets:
-                consecutive_empty += 1
-                if consecutive_empty <= 3 or consecutive_empty % 10 == 0:
-                    print(f"  [SCAN] No weather markets found "
-                          f"(scan #{scan_count}, "
-                          f"{consecutive_empty} consecutive empties)")
-                else:
-                    print(f"  [IDLE] No weather markets. "
-                          f"Next scan in {use_interval}s...", end="\r",
-                          flush=True)
-                save_state(state)
-                time.sleep(use_interval)
-                continue
-
-            # Weather markets found!
-            consecutive_empty = 0
-            state["markets_seen"] += len(weather_markets)
-            state["last_market_found"] = now_utc.strftime("%Y-%m-%d %H:%M:%S")
-
-            print(f"\n  [WEATHER FOUND] {len(weather_markets)} weather markets!")
-            for m in weather_markets[:5]:
-                liq = float(m.get("liquidityNum", 0) or 0)
-                print(f"    - {m.get('question', '')[:70]}  "
-                      f"Liq: ${liq:,.0f}")
-
-            # Process each weather market
-            trades_this_cycle = 0
-            for market in weather_markets:
-                if state["bankroll"] < BET_SIZE:
-                    break
-                if len(state["pending"]) >= MAX_PENDING:
-                    break
-
-                tokens = json.loads(market.get("clobTokenIds", "[]"))
-                outcomes = json.loads(market.get("outcomes", "[]"))
-
-                # Skip already-traded tokens
-                if all(t in traded_set for t in tokens):
-                    continue
-
-                # Get leader positions
-                print(f"\n  [LEADERS] Analyzing: {market.get('question', '')[:60]}")
-                positions = get_leader_positions(market)
-
-                if not positions:
-                    print(f"    No leader positions found")
-                    continue
-
-                # Find consensus outcome
-                outcome_votes = {}
-                for p in positions:
-                    outcome = p.get("outcome", "")
-                    if outcome not in outcome_votes:
-                        outcome_votes[outcome] = {
-                            "count": 0, "total_size": 0,
-                            "best_leader": None
-                        }
-                    outcome_votes[outcome]["count"] += 1
-                    outcome_votes[outcome]["total_size"] += p.get("size", 0)
-                    if (outcome_votes[outcome]["best_leader"] is None or
-                            p.get("size", 0) > outcome_votes[outcome]
-                            ["best_leader"].get("size", 0)):
-                        outcome_votes[outcome]["best_leader"] = p
-
-                # Pick the outcome with most leader support
-                best_outcome = max(outcome_votes.items(),
-                                   key=lambda x: x[1]["total_size"])
-                outcome_name = best_outcome[0]
-                leader = best_outcome[1]["best_leader"]
-
-                print(f"    Leaders favor: {outcome_name} "
-                      f"({best_outcome[1]['count']} traders, "
-                      f"${best_outcome[1]['total_size']:,.0f} size)")
-
-                # Find matching token index
-                outcome_idx = None
-                for i, o in enumerate(outcomes):
-                    if o == outcome_name:
-                        outcome_idx = i
-                        break
-
-                if outcome_idx is None:
-                    print(f"    Could not match outcome '{outcome_name}' "
-                          f"to tokens")
-                    continue
-
-                if tokens[outcome_idx] in traded_set:
-                    print(f"    Already traded this outcome")
-                    continue
-
-                # Execute copy trade
-                success = execute_trade(state, market, outcome_idx,
-                                        leader or {})
-                if success:
-                    trades_this_cycle += 1
-                    time.sleep(0.5)
-
-            # Dashboard
-            print_dashboard(state)
-            save_state(state)
-
-            if trades_this_cycle:
-                print(f"\n  Placed {trades_this_cycle} copy trades this cycle")
-
-            print(f"\n  Next scan in {SCAN_INTERVAL}s...")
-            time.sleep(SCAN_INTERVAL)
-
-        except KeyboardInterrupt:
-            print("\n\n[SHUTDOWN] Saving state...")
-            save_state(state)
-            print_dashboard(state)
-            break
-        except Exception as e:
-            print(f"\n[ERROR] {e}")
-            traceback.print_exc()
-            save_state(state)
-            time.sleep(30)
-
-
-if __name__ == "__main__":
-    run()
+#!/usr/bin/env python3
+"""
+WEATHER BOT — Copy-Trade Top PnL Leaders on Weather Markets
+============================================================
+
+Strategy:
+  1. Continuously scan Polymarket for weather/temperature/climate markets
+  2. When found, identify top PnL traders on those markets
+  3. Copy their YES/NO positions with fixed $5 bets
+  4. Auto-resolve and redeem winning positions
+
+Modes:
+  PAPER — Simulate trades with paper money (no real orders)
+  LIVE  — Execute real FOK orders on CLOB
+
+Runs idle when no weather markets exist. Scans every 5 minutes.
+"""
+
+import asyncio
+import atexit
+import heapq
+import time
+import csv
+import os
+import re
+import sys
+import operator
+import orjson
+import pickle
+import sqlite3
+import threading
+import traceback
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+
+try:
+    import ahocorasick
+except ImportError:          # optional C extension; regex fallback below
+    ahocorasick = None
+try:
+    import msgspec
+except ImportError:          # optional; orjson fallback below
+    msgspec = None
+try:
+    from cachetools import TTLCache
+except ImportError:          # optional; plain-dict fallback below
+    TTLCache = None
+try:
+    import zstandard
+except ImportError:          # optional; log rotation skipped without it
+    zstandard = None
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from dotenv import load_dotenv
+from py_clob_client.client import ClobClient
+from py_clob_client.clob_types import ApiCreds, OrderArgs, OrderType
+from py_clob_client.order_builder.constants import BUY
+
+# ═══════════════════════════════════════════════════════════════
+# CREDENTIALS
+# ═══════════════════════════════════════════════════════════════
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+
+clob_client = ClobClient(
+    "https://clob.polymarket.com",
+    key=os.environ["POLYMARKET_PRIVATE_KEY"],
+    chain_id=137,
+    creds=ApiCreds(
+        api_key=os.environ["POLYMARKET_API_KEY"],
+        api_secret=os.environ["POLYMARKET_API_SECRET"],
+        api_passphrase=os.environ["POLYMARKET_PASSPHRASE"],
+    ),
+)
+
+# ═══════════════════════════════════════════════════════════════
+# CONFIG
+# ═══════════════════════════════════════════════════════════════
+GAMMA_API = "https://gamma-api.polymarket.com"
+CLOB_API = "https://clob.polymarket.com"
+DATA_API = "https://data-api.polymarket.com"
+
+# Shared HTTP session — keep-alive connections reused across threads,
+# so repeat calls to the same host skip the TCP+TLS handshake.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.3),
+))
+SESSION.headers.update({
+    "Accept-Encoding": "gzip",
+    "User-Agent": "weather-bot/1",
+})
+
+# One shared worker pool for all IO fan-out: threads (and the
+# keep-alive connections they hold) persist between scans instead of
+# being recreated per call.
+IO_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="wbot-io")
+atexit.register(IO_POOL.shutdown)
+
+# ── PAPER TRADING MODE ──────────────────────────────────────
+PAPER_MODE = True                    # True = simulate, False = live orders
+PAPER_HOURS = 12                     # Auto-halt after N hours of paper trading
+PAPER_STARTED = None                 # Set at runtime
+
+# Weather keywords to match market questions
+WEATHER_KEYWORDS = [
+    "temperature", "weather", "degrees", "°f", "°c",
+    "fahrenheit", "celsius", "snow", "rainfall", "precipitation",
+    "tornado", "flood", "drought", "heat wave", "polar vortex",
+    "el nino", "la nina", "noaa", "hottest", "coldest", "warmest",
+    "record high", "record low", "winter storm", "blizzard",
+    "tropical storm", "hurricane season", "atlantic hurricane",
+    "climate", "wildfire", "wind speed", "arctic", "ice extent",
+    "sea ice", "record year",
+]
+
+# Server-side scan queries — Gamma filters by tag/search so each scan
+# only downloads candidate markets instead of every active market.
+# Search terms are the high-signal subset of WEATHER_KEYWORDS; the
+# long tail is caught by the local is_weather_market pass.
+SCAN_TAG_SLUGS = ["weather", "climate", "temperature", "hurricane"]
+SCAN_SEARCH_TERMS = [
+    "temperature", "hurricane", "snow", "rainfall",
+    "tornado", "heat wave", "blizzard", "wildfire",
+]
+
+# Aho-Corasick automaton over the keywords: one pass over the text
+# instead of one substring scan per keyword. Built once at import.
+if ahocorasick is not None:
+    _KW_AUTOMATON = ahocorasick.Automaton()
+    for _kw in WEATHER_KEYWORDS:
+        _KW_AUTOMATON.add_word(_kw, _kw)
+    _KW_AUTOMATON.make_automaton()
+else:
+    _KW_AUTOMATON = None
+
+# Single alternation regex fallback: still one C-level pass over the
+# text. IGNORECASE avoids allocating lowercase copies of descriptions.
+KW_RE = re.compile(
+    "|".join(re.escape(k) for k in WEATHER_KEYWORDS), re.IGNORECASE
+)
+
+# Fast pre-filter: single-word keywords checked via one set
+# intersection on the text's tokens; only a miss falls through to the
+# full substring scan (which still catches phrases and compounds like
+# "snowstorm").
+_KW_WORDS = frozenset(
+    k for k in (kw.lower() for kw in WEATHER_KEYWORDS)
+    if " " not in k and "°" not in k
+)
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+# Scanning
+SCAN_INTERVAL = 300       # 5 minutes between scans
+IDLE_SCAN_INTERVAL = 600  # 10 minutes when no markets found (save API calls)
+TOP_TRADERS_COUNT = 10    # Copy top N PnL traders
+
+# Trading
+BET_SIZE = 5.00           # Fixed $5 per trade
+MIN_ASK = 0.10            # Min price (avoid tiny-chance bets)
+MAX_ASK = 0.95            # Max price (avoid near-certain bets with thin ROI)
+MAX_SPREAD = 0.10         # Max bid-ask spread
+MIN_LIQUIDITY = BET_SIZE * 10  # Skip leader analysis on illiquid markets
+
+# Risk
+STARTING_BANKROLL = 1000.00          # Paper money bankroll
+KILL_SWITCH_MIN = 100.00
+MAX_PENDING = 50
+TRADED_TOKENS_CAP = 10000  # Evict oldest dedup entries beyond this
+
+# Files
+STATE_DB = "data/weather_state.sqlite"
+STATE_FILE = "data/weather_state.json"   # legacy; imported once into sqlite
+LOG_FILE = "data/weather_trades.csv"
+MARKETS_CACHE_FILE = "data/markets_cache.pkl"
+LOG_ROTATE_BYTES = 10 * 1024 * 1024  # compress the trade log beyond this
+
+LOG_FIELDS = [
+    "timestamp", "question", "outcome", "leader_address",
+    "leader_pnl", "leader_position",
+    "clob_ask", "clob_bid", "spread",
+    "bet_size", "shares", "potential_profit",
+    "token_id", "condition_id", "order_id",
+    "resolved", "won", "pnl", "bankroll_after", "paper",
+]
+
+
+# ═══════════════════════════════════════════════════════════════
+# STATE & LOGGING
+# ═══════════════════════════════════════════════════════════════
+
+# Scalar counters live in the sqlite `meta` table; pending trades and
+# traded tokens get one row each so a trade/resolution is a single
+# O(1) insert/delete instead of rewriting the whole state blob.
+_META_KEYS = [
+    "version", "bankroll", "pnl", "wins", "losses", "trades",
+    "markets_seen", "last_market_found",
+]
+
+_DB = None
+
+
+def _db():
+    global _DB
+    if _DB is None:
+        os.makedirs("data", exist_ok=True)
+        _DB = sqlite3.connect(STATE_DB)
+        _DB.execute("PRAGMA journal_mode=WAL")
+        _DB.execute("PRAGMA synchronous=NORMAL")
+        _DB.execute("CREATE TABLE IF NOT EXISTS pending "
+                    "(order_id TEXT PRIMARY KEY, json TEXT)")
+        _DB.execute("CREATE TABLE IF NOT EXISTS traded_tokens "
+                    "(token_id TEXT PRIMARY KEY)")
+        _DB.execute("CREATE TABLE IF NOT EXISTS meta "
+                    "(key TEXT PRIMARY KEY, value TEXT)")
+        _DB.commit()
+    return _DB
+
+
+def db_add_pending(trade: dict):
+    db = _db()
+    db.execute("INSERT OR REPLACE INTO pending VALUES (?, ?)",
+               (trade.get("order_id", ""),
+                orjson.dumps(trade, default=_json_default).decode()))
+    db.commit()
+
+
+def db_remove_pending(trade: dict):
+    db = _db()
+    db.execute("DELETE FROM pending WHERE order_id = ?",
+               (trade.get("order_id", ""),))
+    db.commit()
+
+
+def db_add_traded(token_id: str):
+    db = _db()
+    db.execute("INSERT OR IGNORE INTO traded_tokens VALUES (?)",
+               (token_id,))
+    db.commit()
+
+
+def db_remove_traded(token_id: str):
+    db = _db()
+    db.execute("DELETE FROM traded_tokens WHERE token_id = ?",
+               (token_id,))
+    db.commit()
+
+
+def remember_traded(state, token_id: str):
+    """
+    Record a traded token for dedup. The set is capped at
+    TRADED_TOKENS_CAP (oldest evicted first) — resolved tokens needn't
+    block re-trading forever, and the working set stays bounded.
+    """
+    if token_id in state["traded_tokens"]:
+        return
+    state["traded_tokens"].add(token_id)
+    state["_traded_order"].append(token_id)
+    db_add_traded(token_id)
+    while len(state["_traded_order"]) > TRADED_TOKENS_CAP:
+        oldest = state["_traded_order"].popleft()
+        state["traded_tokens"].discard(oldest)
+        db_remove_traded(oldest)
+
+
+def load_state() -> dict:
+    db = _db()
+    meta = dict(db.execute("SELECT key, value FROM meta"))
+    if meta:
+        state = {k: orjson.loads(v) for k, v in meta.items()}
+        if state.get("version") == 2:
+            state["pending"] = [
+                orjson.loads(row[0])
+                for row in db.execute("SELECT json FROM pending")
+            ]
+            # rowid order == insertion order, used for cap eviction
+            ordered = [row[0] for row in db.execute(
+                "SELECT token_id FROM traded_tokens ORDER BY rowid")]
+            state["traded_tokens"] = set(ordered)
+            state["_traded_order"] = deque(ordered)
+            return state
+
+    # One-time import of the legacy JSON state file, if present
+    if os.path.exists(STATE_FILE):
+        try:
+            with open(STATE_FILE, "rb") as f:
+                data = orjson.loads(f.read())
+            if data.get("version") == 2:
+                legacy_tokens = data.get("traded_tokens", [])
+                data["traded_tokens"] = set(legacy_tokens)
+                data["_traded_order"] = deque(legacy_tokens)
+                save_state(data)
+                db.executemany(
+                    "INSERT OR IGNORE INTO pending VALUES (?, ?)",
+                    [(t.get("order_id", ""),
+                      orjson.dumps(t, default=_json_default).decode())
+                     for t in data.get("pending", [])])
+                db.executemany(
+                    "INSERT OR IGNORE INTO traded_tokens VALUES (?)",
+                    [(tok,) for tok in data["traded_tokens"]])
+                db.commit()
+                return data
+        except Exception:
+            pass
+
+    return {
+        "version": 2,
+        "bankroll": STARTING_BANKROLL,
+        "pnl": 0.0,
+        "wins": 0,
+        "losses": 0,
+        "trades": 0,
+        "pending": [],
+        "traded_tokens": set(),
+        "_traded_order": deque(),
+        "markets_seen": 0,
+        "last_market_found": None,
+    }
+
+
+# Write-behind state saving: mutations mark the state dirty and
+# maybe_flush() writes at most once per SAVE_INTERVAL unless forced.
+SAVE_INTERVAL = 5.0
+_state_dirty = False
+_last_save = 0.0
+_last_saved_counters = None
+
+
+def mark_dirty():
+    global _state_dirty
+    _state_dirty = True
+
+
+def maybe_flush(state, force=False, durable=False):
+    """
+    Write state only when dirty and (interval elapsed or forced).
+    `durable` additionally checkpoints the WAL — reserved for
+    money-touching events and shutdown; routine saves stay on the
+    cheap synchronous=NORMAL path.
+    """
+    global _state_dirty, _last_save, _last_saved_counters
+    if not _state_dirty:
+        return
+    if not force and time.monotonic() - _last_save < SAVE_INTERVAL:
+        return
+    # Dirty but unchanged counters (e.g. a resolution pass that found
+    # nothing) would rewrite identical rows — skip those too.
+    counters = orjson.dumps(
+        {k: state.get(k) for k in _META_KEYS}, default=_json_default
+    )
+    if counters == _last_saved_counters and not durable:
+        _state_dirty = False
+        return
+    if durable:
+        save_state_durable(state)
+    else:
+        save_state(state)
+    _state_dirty = False
+    _last_save = time.monotonic()
+    _last_saved_counters = counters
+
+
+def _json_default(o):
+    if isinstance(o, (set, frozenset)):
+        return sorted(o)
+    return str(o)
+
+
+def save_state(state):
+    """
+    Persist the scalar counters in one transaction. Pending trades and
+    traded tokens are written incrementally by db_add_pending /
+    db_remove_pending / db_add_traded, so this stays O(1) regardless
+    of how many trades the bot has accumulated.
+    """
+    db = _db()
+    db.executemany(
+        "INSERT INTO meta (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        [(k, orjson.dumps(state.get(k), default=_json_default).decode())
+         for k in _META_KEYS],
+    )
+    db.commit()
+
+
+def save_state_durable(state):
+    """
+    save_state plus a WAL checkpoint, forcing the journal into the
+    main database file. Only worth paying for after trades and on
+    shutdown; a crash between routine saves loses scan stats at most.
+    """
+    save_state(state)
+    try:
+        _db().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except sqlite3.Error:
+        pass
+
+
+# Long-lived trade-log handle so each row is one buffered write
+# instead of an open/write/close syscall round trip.
+_LOG_F = None
+_LOG_W = None
+
+
+def init_log():
+    global _LOG_F, _LOG_W
+    os.makedirs("data", exist_ok=True)
+    if not os.path.exists(LOG_FILE):
+        with open(LOG_FILE, "w", newline="") as f:
+            csv.DictWriter(f, fieldnames=LOG_FIELDS).writeheader()
+    _LOG_F = open(LOG_FILE, "a", newline="", buffering=1 << 16)
+    _LOG_W = csv.DictWriter(_LOG_F, fieldnames=LOG_FIELDS)
+    atexit.register(_close_log)
+
+
+def _close_log():
+    if _LOG_F is not None:
+        _LOG_F.close()
+
+
+def _rotate_log():
+    """
+    Compress the trade log to a timestamped .zst archive (~5x smaller
+    on repetitive CSV) and start a fresh file. No-op without zstandard.
+    """
+    global _LOG_F, _LOG_W
+    if zstandard is None:
+        return
+    _close_log()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    cctx = zstandard.ZstdCompressor(level=3)
+    with open(LOG_FILE, "rb") as src, \
+            open(f"{LOG_FILE}.{stamp}.zst", "wb") as dst:
+        cctx.copy_stream(src, dst)
+    os.remove(LOG_FILE)
+    init_log()
+
+
+def log_trade(trade: dict):
+    _LOG_W.writerow({k: trade.get(k, "") for k in LOG_FIELDS})
+
+
+def flush_log():
+    """Push buffered rows to disk; called once per scan cycle."""
+    if _LOG_F is not None:
+        _LOG_F.flush()
+        if _LOG_F.tell() > LOG_ROTATE_BYTES:
+            _rotate_log()
+
+
+# ═══════════════════════════════════════════════════════════════
+# MARKET SCANNER
+# ═══════════════════════════════════════════════════════════════
+
+def _has_weather_keyword(lowered: str) -> bool:
+    """Keyword match on already-lowercased text."""
+    if _KW_WORDS.intersection(_TOKEN_RE.findall(lowered)):
+        return True
+    if _KW_AUTOMATON is not None:
+        return next(_KW_AUTOMATON.iter(lowered), None) is not None
+    return KW_RE.search(lowered) is not None
+
+
+def is_weather_market(market: dict) -> bool:
+    """
+    Check if a market is weather-related based on question + description.
+    The short question is checked first; the description (capped at 2KB
+    — some are multi-KB HTML blobs) is only scanned on a miss. Verdicts
+    are memoized per market id across scans.
+    """
+    mid = market.get("id")
+    verdict = _WEATHER_VERDICTS.get(mid)
+    if verdict is not None:
+        return verdict
+
+    q = (market.get("question", "") or "").lower()
+    verdict = _has_weather_keyword(q)
+    if not verdict:
+        desc = (market.get("description", "") or "").lower()[:2048]
+        verdict = bool(desc) and _has_weather_keyword(desc)
+    if mid is not None:
+        _WEATHER_VERDICTS[mid] = verdict
+    return verdict
+
+
+# Typed decoding of Gamma market listings: a msgspec.Struct decoder
+# parses only the ~8 fields the bot reads and skips the other 30+ a
+# market payload carries, so the scan never materializes them. The
+# structs are flattened back to lean dicts so downstream code (and the
+# pickled response cache) is unaffected.
+if msgspec is not None:
+    class _Market(msgspec.Struct, frozen=True):
+        id: str = ""
+        question: str = ""
+        description: str = ""
+        conditionId: str = ""
+        outcomes: str = "[]"
+        clobTokenIds: str = "[]"
+        outcomePrices: str = "[]"
+        liquidityNum: float | str | None = 0.0
+
+    _MARKET_DECODER = msgspec.json.Decoder(list[_Market])
+
+    def _decode_market_batch(raw: bytes) -> list:
+        return [
+            {
+                "id": m.id,
+                "question": m.question,
+                "description": m.description,
+                "conditionId": m.conditionId,
+                "outcomes": m.outcomes,
+                "clobTokenIds": m.clobTokenIds,
+                "outcomePrices": m.outcomePrices,
+                "liquidityNum": m.liquidityNum,
+            }
+            for m in _MARKET_DECODER.decode(raw)
+        ]
+else:
+    def _decode_market_batch(raw: bytes) -> list:
+        return orjson.loads(raw)
+
+
+def _aiohttp_session(total_timeout: int, limit_per_host: int = 8):
+    """Consistently configured aiohttp session for the async fan-outs."""
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=16, limit_per_host=limit_per_host, ttl_dns_cache=300,
+        ),
+        timeout=aiohttp.ClientTimeout(total=total_timeout),
+    )
+
+
+# Short-TTL response cache with ETag revalidation: within the TTL a
+# repeat query returns the cached body without touching the network;
+# after it, If-None-Match turns an unchanged listing into a cheap 304.
+# Persisted to disk so ETags survive restarts.
+HTTP_CACHE_TTL = 60.0
+_HTTP_CACHE = {}
+
+# Remembered is_weather_market verdicts, keyed on market id — repeat
+# scans mostly see the same markets, so the keyword scan only runs on
+# new ones. Negative results are cached too; that's where the win is.
+# TTLCache bounds the memo and lets edited markets be re-classified
+# within the hour; without cachetools a plain dict does the same job
+# minus the eviction.
+_WEATHER_VERDICTS = (TTLCache(maxsize=20000, ttl=3600)
+                     if TTLCache is not None else {})
+
+
+def load_http_cache():
+    global _HTTP_CACHE
+    try:
+        with open(MARKETS_CACHE_FILE, "rb") as f:
+            _HTTP_CACHE = pickle.load(f)
+    except Exception:
+        _HTTP_CACHE = {}
+
+
+def save_http_cache():
+    try:
+        os.makedirs("data", exist_ok=True)
+        with open(MARKETS_CACHE_FILE, "wb") as f:
+            pickle.dump(_HTTP_CACHE, f)
+    except Exception:
+        pass
+
+
+async def _fetch_filtered_markets(session, sem, extra_params: dict) -> list:
+    """
+    Fetch one server-side-filtered listing from Gamma through the
+    TTL/ETag cache. Returns [] on any error.
+    """
+    params = {"active": "true", "closed": "false", "limit": 100,
+              **extra_params}
+    key = (f"{GAMMA_API}/markets", tuple(sorted(params.items())))
+    now = time.time()   # wall clock: the cache is persisted across runs
+    entry = _HTTP_CACHE.get(key)
+    if entry and now - entry["ts"] < HTTP_CACHE_TTL:
+        return entry["body"]
+
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    try:
+        async with sem:
+            async with session.get(
+                f"{GAMMA_API}/markets", params=params, headers=headers
+            ) as resp:
+                if resp.status == 304 and entry:
+                    entry["ts"] = now
+                    return entry["body"]
+                if resp.status != 200:
+                    return []
+                body = _decode_market_batch(await resp.read())
+                etag = resp.headers.get("ETag")
+    except Exception as e:
+        print(f"  [WARN] Gamma scan error for {extra_params}: {e}")
+        return []
+
+    _HTTP_CACHE[key] = {"ts": now, "etag": etag, "body": body}
+    return body
+
+
+async def _scan_weather_markets_async(queries: list) -> list:
+    """Issue all scan queries concurrently on one aiohttp session."""
+    sem = asyncio.Semaphore(8)
+    async with _aiohttp_session(total_timeout=15) as session:
+        return await asyncio.gather(
+            *[_fetch_filtered_markets(session, sem, q) for q in queries],
+            return_exceptions=True,
+        )
+
+
+def scan_weather_markets() -> list:
+    """
+    Scan Polymarket for weather-related markets.
+    Filtering happens server-side: one Gamma query per weather tag /
+    search term (fetched concurrently), deduped by conditionId.
+    is_weather_market stays as a belt-and-suspenders local check.
+    Returns list of weather market dicts sorted by liquidity (highest first).
+    """
+    queries = ([{"tag_slug": t} for t in SCAN_TAG_SLUGS] +
+               [{"search": s} for s in SCAN_SEARCH_TERMS])
+
+    # Filter each batch as it arrives so only weather markets are
+    # retained; the rest of a batch is garbage as soon as it's scanned.
+    weather_by_cid = {}
+    for batch in asyncio.run(_scan_weather_markets_async(queries)):
+        if isinstance(batch, BaseException):
+            continue
+        for m in batch:
+            cid = m.get("conditionId") or m.get("id")
+            if cid and cid not in weather_by_cid and is_weather_market(m):
+                weather_by_cid[cid] = m
+
+    weather = list(weather_by_cid.values())
+
+    # Parse the string-encoded JSON fields once per scan; downstream
+    # code reads the cached copies instead of re-parsing per use.
+    # liquidityNum is normalized to float here too, so the sort and
+    # every later liquidity check skip the per-use coercion.
+    for m in weather:
+        m["_tokens"] = orjson.loads(m.get("clobTokenIds") or "[]")
+        m["_outcomes"] = orjson.loads(m.get("outcomes") or "[]")
+        m["_prices"] = orjson.loads(m.get("outcomePrices") or "[]")
+        m["liquidityNum"] = float(m.get("liquidityNum") or 0)
+
+    # Sort by liquidity (most liquid first)
+    weather.sort(key=operator.itemgetter("liquidityNum"), reverse=True)
+
+    save_http_cache()
+    return weather
+
+
+# ═══════════════════════════════════════════════════════════════
+# TOP PNL LEADER IDENTIFICATION
+# ═══════════════════════════════════════════════════════════════
+
+def get_top_traders(condition_id: str) -> list:
+    """
+    Get top PnL traders for a specific market condition.
+    Uses Polymarket's data API to find traders with highest profit.
+    Returns list of {"address": str, "pnl": float, "position": "YES"/"NO", "size": float}
+    """
+    try:
+        # Get market activity/positions
+        resp = SESSION.get(
+            f"{DATA_API}/activity",
+            params={
+                "market": condition_id,
+                "limit": 50,
+            },
+            timeout=15,
+        )
+        if resp.status_code != 200:
+            return []
+        activities = orjson.loads(resp.content)
+        if not activities:
+            return []
+
+        # Aggregate volume per trader as flat [buys, sells] pairs;
+        # full trader dicts are only built for the final top N.
+        volumes = {}
+        for a in activities:
+            addr = a.get("proxyWalletAddress", "") or a.get("address", "")
+            if not addr:
+                continue
+            size = float(a.get("usdcSize", 0) or 0)
+            side = a.get("side", "")
+            vol = volumes.get(addr)
+            if vol is None:
+                vol = volumes[addr] = [0.0, 0.0]
+            if side == "BUY":
+                vol[0] += size
+            elif side == "SELL":
+                vol[1] += size
+
+        # Top N by volume (proxy for engagement/confidence) —
+        # O(N log K) instead of sorting every trader just to slice 10
+        top = heapq.nlargest(TOP_TRADERS_COUNT, volumes.items(),
+                             key=lambda kv: kv[1][0] + kv[1][1])
+        return [{"address": addr, "pnl": sells,  # profit from selling
+                 "buys": buys, "sells": sells}
+                for addr, (buys, sells) in top]
+
+    except Exception as e:
+        print(f"  [WARN] Failed to get traders for {condition_id[:16]}: {e}")
+        return []
+
+
+# The same leaders show up on several weather markets within one
+# cycle; their /positions responses are reused for a 5-minute bucket.
+# get_leader_positions runs on up to 16 IO_POOL threads at once, so
+# every cache access goes through a lock — an unguarded dict raises
+# "dictionary changed size during iteration" under concurrent eviction.
+POSITIONS_TTL = 300
+_POSITIONS_CACHE = {}
+_POSITIONS_LOCK = threading.Lock()
+
+
+async def _fetch_positions(session, addr, sem):
+    """Fetch one trader's positions; the semaphore bounds concurrency."""
+    bucket = int(time.time() // POSITIONS_TTL)
+    key = (addr, bucket)
+    with _POSITIONS_LOCK:
+        cached = _POSITIONS_CACHE.get(key)
+    if cached is not None:
+        return addr, cached
+
+    async with sem:
+        async with session.get(
+            f"{DATA_API}/positions", params={"user": addr}
+        ) as resp:
+            if resp.status != 200:
+                return addr, []
+            positions = await resp.json(loads=orjson.loads)
+
+    # Evict previous buckets so the cache stays one cycle big
+    with _POSITIONS_LOCK:
+        for k in [k for k in _POSITIONS_CACHE if k[1] != bucket]:
+            _POSITIONS_CACHE.pop(k, None)
+        _POSITIONS_CACHE[key] = positions
+    return addr, positions
+
+
+async def _gather_leader_positions(addresses: list) -> list:
+    """Fetch all leaders' positions concurrently (network-IO-bound)."""
+    sem = asyncio.Semaphore(5)
+    async with _aiohttp_session(total_timeout=10, limit_per_host=5) as session:
+        return await asyncio.gather(
+            *[_fetch_positions(session, a, sem) for a in addresses],
+            return_exceptions=True,
+        )
+
+
+def get_leader_positions(market: dict) -> list:
+    """
+    For a weather market, find what the top PnL traders are betting on.
+    Returns list of {"outcome": str, "confidence": float, "leaders": int}
+    """
+    condition_id = market.get("conditionId", "")
+    if not condition_id:
+        return []
+
+    outcomes = market["_outcomes"]
+    tokens = market["_tokens"]
+
+    if not outcomes or not tokens:
+        return []
+
+    # Get top traders
+    traders = get_top_traders(condition_id)
+    if not traders:
+        return []
+
+    # Determine leader consensus from their positions — top 5 fanned
+    # out concurrently; the semaphore replaces the old per-call sleep
+    try:
+        pnl_by_addr = {t["address"]: t["pnl"] for t in traders[:5]}
+        results = asyncio.run(_gather_leader_positions(list(pnl_by_addr)))
+
+        positions_data = []
+        for res in results:
+            if isinstance(res, BaseException):
+                continue
+            addr, positions = res
+            for p in positions:
+                if p.get("conditionId") == condition_id:
+                    positions_data.append({
+                        "address": addr,
+                        "outcome": p.get("outcome", ""),
+                        "size": float(p.get("size", 0)),
+                        "pnl": pnl_by_addr[addr],
+                    })
+        return positions_data
+    except Exception as e:
+        print(f"  [WARN] Failed to get leader positions: {e}")
+        return []
+
+
+# ═══════════════════════════════════════════════════════════════
+# TRADE EXECUTION
+# ═══════════════════════════════════════════════════════════════
+
+def get_clob_prices_batch(token_ids: list) -> dict:
+    """
+    Get bid/ask for many tokens in one CLOB round trip.
+    Returns {token_id: {"bid": float, "ask": float}}.
+    """
+    result = {tid: {"bid": 0.0, "ask": 0.0} for tid in token_ids}
+    if not token_ids:
+        return result
+    try:
+        params = [{"token_id": t, "side": s}
+                  for t in token_ids for s in ("BUY", "SELL")]
+        resp = SESSION.post(f"{CLOB_API}/prices", json=params, timeout=15)
+        if resp.status_code != 200:
+            return result
+        for tid, sides in orjson.loads(resp.content).items():
+            if tid in result:
+                result[tid]["bid"] = float(sides.get("BUY", 0) or 0)
+                result[tid]["ask"] = float(sides.get("SELL", 0) or 0)
+    except Exception as e:
+        print(f"  [WARN] Batch price fetch failed: {e}")
+    return result
+
+
+def get_clob_prices(token_id: str) -> dict:
+    """Get bid/ask for a single token from CLOB."""
+    return get_clob_prices_batch([token_id])[token_id]
+
+
+def execute_trade(state, market, outcome_idx, leader_info):
+    """
+    Place a trade copying the leader's position.
+    PAPER_MODE: simulate fill at current ask (no real order).
+    LIVE:       place real FOK buy order on CLOB.
+    """
+    tokens = market["_tokens"]
+    outcomes = market["_outcomes"]
+
+    if outcome_idx >= len(tokens):
+        return False
+
+    token_id = tokens[outcome_idx]
+    outcome = outcomes[outcome_idx] if outcome_idx < len(outcomes) else "?"
+
+    # Cheap pre-check on Gamma's own outcome price before paying for
+    # the authoritative CLOB quote: reject clearly out-of-range asks
+    # (with a 10% margin since the Gamma value can be stale).
+    gamma_prices = market.get("_prices") or []
+    if outcome_idx < len(gamma_prices):
+        try:
+            gamma_price = float(gamma_prices[outcome_idx])
+        except (TypeError, ValueError):
+            gamma_price = 0.0
+        if gamma_price and (gamma_price < MIN_ASK * 0.9
+                            or gamma_price > MAX_ASK * 1.1):
+            print(f"  [SKIP] {outcome} gamma price=${gamma_price:.2f} "
+                  f"outside range ${MIN_ASK:.2f}-${MAX_ASK:.2f}")
+            return False
+
+    prices = get_clob_prices(token_id)
+    ask = prices["ask"]
+    bid = prices["bid"]
+
+    if ask <= 0 or ask >= 1:
+        return False
+    if ask < MIN_ASK or ask > MAX_ASK:
+        print(f"  [SKIP] {outcome} ask=${ask:.2f} outside range "
+              f"${MIN_ASK:.2f}-${MAX_ASK:.2f}")
+        return False
+
+    spread = ask - bid
+    if spread > MAX_SPREAD:
+        print(f"  [SKIP] {outcome} spread=${spread:.3f} > max ${MAX_SPREAD:.2f}")
+        return False
+
+    shares = int(BET_SIZE / ask)
+    if shares < 1:
+        return False
+
+    actual_cost = round(shares * ask, 2)
+    order_id = ""
+    mode_tag = "PAPER" if PAPER_MODE else "LIVE"
+
+    if PAPER_MODE:
+        # ── PAPER: simulate instant fill at ask price ──
+        import uuid
+        order_id = f"paper-{uuid.uuid4().hex[:12]}"
+    else:
+        # ── LIVE: real FOK order ──
+        try:
+            order_args = OrderArgs(
+                token_id=token_id,
+                price=round(ask, 2),
+                size=shares,
+                side=BUY,
+            )
+            signed_order = clob_client.create_order(order_args)
+            resp = clob_client.post_order(signed_order, OrderType.FOK)
+
+            if not resp or not resp.get("success"):
+                print(f"  [NOFILL] {outcome} @ ${ask:.2f}")
+                return False
+        except Exception as e:
+            print(f"  [ERROR] Order failed: {e}")
+            return False
+        order_id = resp.get("orderID", "")
+
+    trade = {
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp_epoch": time.time(),  # avoids ISO parsing on resolution
+        "question": market.get("question", "")[:100],
+        "outcome": outcome,
+        "leader_address": leader_info.get("address", "")[:16] + "...",
+        "leader_pnl": leader_info.get("pnl", 0),
+        "leader_position": leader_info.get("outcome", ""),
+        "clob_ask": ask,
+        "clob_bid": bid,
+        "spread": round(spread, 3),
+        "bet_size": actual_cost,
+        "shares": shares,
+        "potential_profit": round(shares - actual_cost, 4),
+        "token_id": token_id,
+        "condition_id": market.get("conditionId", ""),
+        "order_id": order_id,
+        "resolved": False,
+        "paper": PAPER_MODE,
+    }
+
+    state["pending"].append(trade)
+    state["trades"] += 1
+    state["bankroll"] -= actual_cost
+    remember_traded(state, token_id)
+
+    db_add_pending(trade)
+    mark_dirty()
+    maybe_flush(state, force=True, durable=True)
+    log_trade(trade)
+
+    roi = (1 - ask) / ask * 100
+    print(f"\n  >>> [{mode_tag}] COPY TRADE: {outcome} @ ${ask:.2f} "
+          f"({roi:.1f}% ROI)")
+    print(f"      {market.get('question', '')[:60]}")
+    print(f"      Copying leader: {leader_info.get('address', '')[:16]}... "
+          f"(PnL: ${leader_info.get('pnl', 0):,.2f})")
+    print(f"      Order: {order_id[:16]}... | "
+          f"${actual_cost:.2f} for {shares} shares")
+    print(f"      Bankroll: ${state['bankroll']:.2f}")
+
+    return True
+
+
+# ═══════════════════════════════════════════════════════════════
+# RESOLUTION
+# ═══════════════════════════════════════════════════════════════
+
+def resolve_paper_trade(t, state, clob_prices=None):
+    """
+    Resolve a paper trade by checking if the market has resolved.
+    Uses Gamma API to check if the market's condition has settled.
+    Falls back to checking if our outcome's price hit $1 or $0.
+    `clob_prices` is an optional pre-fetched {token_id: {bid, ask}} map
+    so resolving N trades costs one CLOB round trip, not N.
+    """
+    tid = t.get("token_id", "")
+    cid = t.get("condition_id", "")
+
+    # Check if market resolved via Gamma API
+    try:
+        resp = SESSION.get(
+            f"{GAMMA_API}/markets",
+            params={"condition_id": cid},
+            timeout=10,
+        )
+        if resp.status_code == 200:
+            markets = orjson.loads(resp.content)
+            if markets:
+                m = markets[0]
+                # Market has resolved
+                if m.get("closed") or m.get("resolved"):
+                    outcome_prices = orjson.loads(m.get("outcomePrices", "[]"))
+                    tokens = orjson.loads(m.get("clobTokenIds", "[]"))
+                    # Find our token's final price
+                    for i, tok in enumerate(tokens):
+                        if tok == tid and i < len(outcome_prices):
+                            final_price = float(outcome_prices[i])
+                            won = final_price > 0.5  # our side resolved YES
+                            return won
+    except Exception:
+        pass
+
+    # Fallback: check if current price hit extreme (market settling)
+    try:
+        if clob_prices is not None and tid in clob_prices:
+            prices = clob_prices[tid]
+        else:
+            prices = get_clob_prices(tid)
+        if prices["ask"] >= 0.99 or prices["bid"] >= 0.99:
+            return True   # our token is worth $1 — WIN
+        if prices["ask"] <= 0.01 and prices["bid"] <= 0.01:
+            return False  # our token is worth $0 — LOSS
+    except Exception:
+        pass
+
+    return None  # not resolved yet
+
+
+def resolve_trades(state):
+    """
+    Check pending trades for resolution.
+    PAPER mode: check market resolution via Gamma/price APIs.
+    LIVE mode:  check positions via Data API.
+    """
+    if not state["pending"]:
+        return
+
+    still_pending = []
+    now = time.time()  # one clock read for every stale check below
+
+    if not PAPER_MODE:
+        # ── LIVE resolution via Data API ──
+        try:
+            wallet = os.environ["POLYMARKET_WALLET"]
+            positions = orjson.loads(SESSION.get(
+                f"{DATA_API}/positions?user={wallet}",
+                timeout=15,
+            ).content)
+        except Exception as e:
+            print(f"  [WARN] Resolution check failed: {e}")
+            return
+
+        pos_map = {}
+        for p in positions:
+            tid = p.get("asset", "") or p.get("tokenId", "")
+            if tid:
+                pos_map[tid] = p
+
+        for t in state["pending"]:
+            tid = t.get("token_id", "")
+            pos = pos_map.get(tid)
+
+            if pos and pos.get("redeemable"):
+                won = float(pos.get("curValue", 0)) > 0
+                _record_resolution(t, state, won)
+            else:
+                if _check_stale(t, state, now):
+                    continue
+                still_pending.append(t)
+    else:
+        # ── PAPER resolution via market status ──
+        pending_tokens = [t.get("token_id", "") for t in state["pending"]]
+        clob_prices = get_clob_prices_batch(pending_tokens)
+        for t in state["pending"]:
+            result = resolve_paper_trade(t, state, clob_prices)
+            if result is not None:
+                _record_resolution(t, state, result)
+            else:
+                if _check_stale(t, state, now):
+                    continue
+                still_pending.append(t)
+
+    state["pending"] = still_pending
+
+
+def _record_resolution(t, state, won):
+    """Record a win or loss."""
+    if won:
+        payout = t["shares"] * 1.0
+        pnl = payout - t["bet_size"]
+        state["bankroll"] += payout
+        state["wins"] += 1
+    else:
+        pnl = -t["bet_size"]
+        state["losses"] += 1
+
+    state["pnl"] += pnl
+    t["resolved"] = True
+    t["won"] = won
+    t["pnl"] = round(pnl, 4)
+    t["bankroll_after"] = round(state["bankroll"], 2)
+    db_remove_pending(t)
+    mark_dirty()
+    log_trade(t)
+
+    mark = "WIN" if won else "LOSS"
+    mode = "[PAPER]" if t.get("paper") else "[LIVE]"
+    w, l = state["wins"], state["losses"]
+    wr = w / max(w + l, 1)
+    print(f"\n  {'>>>' if won else 'XXX'} {mode} RESOLVED: "
+          f"{t['outcome']} -> {mark}")
+    print(f"      {t['question'][:50]}")
+    print(f"      PnL: ${pnl:+.4f} | Bank: ${state['bankroll']:.2f} | "
+          f"{w}W-{l}L ({wr:.1%})")
+
+
+def _check_stale(t, state, now=None):
+    """Mark positions older than 72h as losses. Returns True if stale."""
+    try:
+        if now is None:
+            now = time.time()
+        epoch = t.get("timestamp_epoch")
+        if epoch is None:
+            # trades from before timestamp_epoch existed
+            epoch = datetime.fromisoformat(
+                t["timestamp"].replace("Z", "+00:00")
+            ).timestamp()
+        age = now - epoch
+        if age > 259200:  # >72h
+            print(f"  [STALE] Marking as loss (>72h): {t['question'][:50]}")
+            pnl = -t["bet_size"]
+            state["losses"] += 1
+            state["pnl"] += pnl
+            t["resolved"] = True
+            t["won"] = False
+            t["pnl"] = round(pnl, 4)
+            t["bankroll_after"] = round(state["bankroll"], 2)
+            db_remove_pending(t)
+            mark_dirty()
+            log_trade(t)
+            return True
+    except Exception:
+        pass
+    return False
+
+
+# ═══════════════════════════════════════════════════════════════
+# DISPLAY
+# ═══════════════════════════════════════════════════════════════
+
+def print_banner():
+    mode_str = "PAPER TRADING" if PAPER_MODE else "LIVE TRADING"
+    print("=" * 70)
+    print(f"  WEATHER BOT — {mode_str}")
+    print(f"  Copy-Trade Top PnL Leaders on Temperature/Weather Markets")
+    if PAPER_MODE:
+        print(f"  Paper window: {PAPER_HOURS}h — goes live after validation")
+    print(f"  Scan: every {SCAN_INTERVAL}s | "
+          f"Idle: every {IDLE_SCAN_INTERVAL}s")
+    print(f"  Bet: ${BET_SIZE:.2f} fixed | "
+          f"Ask range: ${MIN_ASK:.2f}-${MAX_ASK:.2f}")
+    print(f"  Bankroll: ${STARTING_BANKROLL:.2f} | "
+          f"Keywords: {len(WEATHER_KEYWORDS)} weather terms")
+    print(f"  {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}")
+    print("=" * 70)
+
+
+def print_dashboard(state):
+    w, l = state["wins"], state["losses"]
+    wr = w / max(w + l, 1)
+    pending = len(state["pending"])
+    mode_str = "PAPER" if PAPER_MODE else "LIVE"
+
+    # Paper mode countdown
+    time_info = ""
+    if PAPER_MODE and PAPER_STARTED:
+        elapsed = (datetime.now(timezone.utc) - PAPER_STARTED).total_seconds()
+        remaining = max(0, PAPER_HOURS * 3600 - elapsed)
+        h, m = int(remaining // 3600), int((remaining % 3600) // 60)
+        time_info = f"  Paper time left: {h}h {m}m"
+
+    print(f"\n{'=' * 70}")
+    print(f"  [{mode_str}] WEATHER DASHBOARD | "
+          f"{datetime.now(timezone.utc).strftime('%H:%M:%S UTC')}")
+    print(f"{'=' * 70}")
+    print(f"  Bankroll:  ${state['bankroll']:>10,.2f}  |  "
+          f"PnL: ${state['pnl']:>+10,.2f}")
+    print(f"  Record:    {w}W-{l}L ({wr:.1%})  |  "
+          f"Trades: {state['trades']}")
+    print(f"  Pending:   {pending} positions")
+    print(f"  Markets seen: {state['markets_seen']}  |  "
+          f"Last found: {state.get('last_market_found', 'never')}")
+    if time_info:
+        print(time_info)
+    print(f"{'=' * 70}")
+
+
+# ═══════════════════════════════════════════════════════════════
+# MAIN LOOP
+# ═══════════════════════════════════════════════════════════════
+
+def print_paper_summary(state):
+    """Print final paper trading summary after 12h window expires."""
+    w, l = state["wins"], state["losses"]
+    wr = w / max(w + l, 1)
+    total = w + l
+    print("\n" + "=" * 70)
+    print("  PAPER TRADING COMPLETE — 12 HOUR SUMMARY")
+    print("=" * 70)
+    print(f"  Starting Bankroll:  ${STARTING_BANKROLL:>10,.2f}")
+    print(f"  Final Bankroll:     ${state['bankroll']:>10,.2f}")
+    print(f"  Net PnL:            ${state['pnl']:>+10,.2f}")
+    print(f"  ROI:                {state['pnl']/STARTING_BANKROLL*100:>+.2f}%")
+    print(f"  Record:             {w}W-{l}L ({wr:.1%})")
+    print(f"  Total trades:       {total}")
+    print(f"  Still pending:      {len(state['pending'])}")
+    print(f"  Markets scanned:    {state['markets_seen']}")
+    print("=" * 70)
+    if total == 0:
+        print("  No trades placed — weather markets had no leader data.")
+        print("  Consider widening keywords or lowering MIN_ASK.")
+    elif wr >= 0.55 and state["pnl"] > 0:
+        print("  RESULT: Profitable. Safe to go LIVE.")
+        print("  Set PAPER_MODE = False and restart.")
+    elif wr >= 0.45:
+        print("  RESULT: Break-even. Review before going live.")
+    else:
+        print("  RESULT: Unprofitable. Do NOT go live without changes.")
+    print("=" * 70 + "\n")
+
+
+def run():
+    global PAPER_STARTED
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    init_log()
+    load_http_cache()
+    state = load_state()
+
+    if PAPER_MODE:
+        PAPER_STARTED = datetime.now(timezone.utc)
+
+    print_banner()
+
+    print(f"\n  Loaded state: {state['trades']} trades, "
+          f"${state['bankroll']:.2f} bankroll, "
+          f"{len(state['pending'])} pending")
+
+    scan_count = 0
+    consecutive_empty = 0
+
+    while True:
+        try:
+            scan_count += 1
+            now_utc = datetime.now(timezone.utc)
+            flush_log()
+
+            # ── Paper mode 12h auto-halt ──
+            if PAPER_MODE and PAPER_STARTED:
+                elapsed_h = (now_utc - PAPER_STARTED).total_seconds() / 3600
+                if elapsed_h >= PAPER_HOURS:
+                    print_paper_summary(state)
+                    maybe_flush(state, force=True, durable=True)
+                    print("  Bot halted. Set PAPER_MODE=False to go live.")
+                    return
+
+            # Resolve any pending trades
+            resolve_trades(state)
+
+            # Safety checks
+            if state["bankroll"] < KILL_SWITCH_MIN:
+                print(f"\n  [KILL SWITCH] Bankroll ${state['bankroll']:.2f} "
+                      f"< ${KILL_SWITCH_MIN:.2f}")
+                print_dashboard(state)
+                maybe_flush(state)
+                time.sleep(IDLE_SCAN_INTERVAL)
+                continue
+
+            if len(state["pending"]) >= MAX_PENDING:
+                print(f"  [MAX PENDING] {len(state['pending'])} positions")
+                maybe_flush(state)
+                time.sleep(SCAN_INTERVAL)
+                continue
+
+            # Scan for weather markets
+            use_interval = (IDLE_SCAN_INTERVAL if consecutive_empty > 3
+                            else SCAN_INTERVAL)
+
+            print(f"\n  [SCAN #{scan_count}] "
+                  f"{now_utc.strftime('%H:%M:%S UTC')} — "
+                  f"scanning for weather markets...")
+
+            weather_markets = scan_weather_markets()
+            traded_set = state["traded_tokens"]
+
+            if not weather_markets:
+                consecutive_empty += 1
+                if consecutive_empty <= 3 or consecutive_empty % 10 == 0:
+                    print(f"  [SCAN] No weather markets found "
+                          f"(scan #{scan_count}, "
+                          f"{consecutive_empty} consecutive empties)")
+                else:
+                    print(f"  [IDLE] No weather markets. "
+                          f"Next scan in {use_interval}s...", end="\r",
+                          flush=True)
+                maybe_flush(state)
+                time.sleep(use_interval)
+                continue
+
+            # Weather markets found!
+            consecutive_empty = 0
+            state["markets_seen"] += len(weather_markets)
+            state["last_market_found"] = now_utc.strftime("%Y-%m-%d %H:%M:%S")
+            mark_dirty()
+
+            print(f"\n  [WEATHER FOUND] {len(weather_markets)} weather markets!")
+            for m in weather_markets[:5]:
+                liq = m["liquidityNum"]
+                print(f"    - {m.get('question', '')[:70]}  "
+                      f"Liq: ${liq:,.0f}")
+
+            # Skip illiquid markets (they can't clear the MIN_ASK /
+            # BET_SIZE constraints anyway) and markets whose tokens are
+            # all already traded, then analyze leader positions
+            # concurrently (network-bound). Trade execution below stays
+            # serial so order submission and bankroll accounting remain
+            # race-free.
+            candidates = [
+                m for m in weather_markets
+                if m["liquidityNum"] >= MIN_LIQUIDITY
+                and not all(t in traded_set for t in m["_tokens"])
+            ]
+            skipped = len(weather_markets) - len(candidates)
+            if skipped:
+                print(f"  [SKIP] {skipped} illiquid/already-traded markets")
+
+            print(f"\n  [LEADERS] Analyzing {len(candidates)} markets...")
+            analyzed = list(zip(
+                candidates, IO_POOL.map(get_leader_positions, candidates)
+            ))
+
+            # Process each weather market
+            trades_this_cycle = 0
+            for market, positions in analyzed:
+                if state["bankroll"] < BET_SIZE:
+                    break
+                if len(state["pending"]) >= MAX_PENDING:
+                    break
+
+                tokens = market["_tokens"]
+                outcomes = market["_outcomes"]
+
+                print(f"\n  [LEADERS] {market.get('question', '')[:60]}")
+                if not positions:
+                    print(f"    No leader positions found")
+                    continue
+
+                # Find consensus outcome
+                outcome_votes = defaultdict(lambda: {
+                    "count": 0, "total_size": 0.0, "best_leader": None,
+                })
+                for p in positions:
+                    votes = outcome_votes[p.get("outcome", "")]
+                    votes["count"] += 1
+                    votes["total_size"] += p.get("size", 0)
+                    if (votes["best_leader"] is None or
+                            p.get("size", 0) >
+                            votes["best_leader"].get("size", 0)):
+                        votes["best_leader"] = p
+
+                # Pick the outcome with most leader support
+                best_outcome = max(outcome_votes.items(),
+                                   key=lambda x: x[1]["total_size"])
+                outcome_name = best_outcome[0]
+                leader = best_outcome[1]["best_leader"]
+
+                print(f"    Leaders favor: {outcome_name} "
+                      f"({best_outcome[1]['count']} traders, "
+                      f"${best_outcome[1]['total_size']:,.0f} size)")
+
+                # Find matching token index
+                outcome_index = {o: i for i, o in enumerate(outcomes)}
+                outcome_idx = outcome_index.get(outcome_name)
+
+                if outcome_idx is None:
+                    print(f"    Could not match outcome '{outcome_name}' "
+                          f"to tokens")
+                    continue
+
+                if tokens[outcome_idx] in traded_set:
+                    print(f"    Already traded this outcome")
+                    continue
+
+                # Execute copy trade
+                success = execute_trade(state, market, outcome_idx,
+                                        leader or {})
+                if success:
+                    trades_this_cycle += 1
+                    time.sleep(0.5)
+
+            # Dashboard
+            print_dashboard(state)
+            maybe_flush(state)
+
+            if trades_this_cycle:
+                print(f"\n  Placed {trades_this_cycle} copy trades this cycle")
+
+            print(f"\n  Next scan in {SCAN_INTERVAL}s...")
+            time.sleep(SCAN_INTERVAL)
+
+        except KeyboardInterrupt:
+            print("\n\n[SHUTDOWN] Saving state...")
+            maybe_flush(state, force=True, durable=True)
+            flush_log()
+            print_dashboard(state)
+            break
+        except Exception as e:
+            print(f"\n[ERROR] {e}")
+            traceback.print_exc()
+            maybe_flush(state, force=True)
+            time.sleep(30)
+
+
+if __name__ == "__main__":
+    run()